@@ -22,7 +22,41 @@ pygame というのがいろいろ高機能である、というのを見てな
 ボタンもなにもないシンプルな画面です。
 
 vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv'''
+import itertools
+import os
+import queue
+import threading
+import weakref
+import numpy as np
 import pygame
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def _dilate(mask, size, axis):
+    u'''真偽値配列の True の位置を、指定した軸の正の向きに size 個分広げる。
+    '''
+    total = np.cumsum(mask, axis=axis, dtype=np.int32)
+    window = total.copy()
+    if axis == 0:
+        window[size:] -= total[:-size]
+    else:
+        window[:, size:] -= total[:, :-size]
+    return window > 0
+
+def to_dots_array(dots):
+    u'''「生」セルの座標の set を (N, 2) の np.int32 配列に変換する。
+    配列が与えられた場合はそのまま返す。
+    Args:
+        dots : set or numpy.ndarray : 「生」セルの座標
+    Returns:
+        numpy.ndarray : (N, 2) の np.int32 配列
+    '''
+    if isinstance(dots, np.ndarray):
+        return dots
+    return np.fromiter(itertools.chain.from_iterable(dots),
+                       dtype=np.int32, count=2 * len(dots)).reshape(-1, 2)
 
 class LifeDisplay:
     u'''pygame を使ってライフゲームの盤面を表示する。
@@ -42,41 +76,160 @@ class LifeDisplay:
             alive_color:  tuple(int) : 「生」セルの色
         '''
         self.MARGIN = 10
+        self.DIRTY_AREA_RATIO = 0.25
         self.width, self.height = width, height
         self.bg_color, self.grid_color = bg_color, grid_color
         self.alive_color = alive_color
         pygame.init()
-        self.screen = pygame.display.set_mode((self.width, self.height))
+        self.screen = self._set_mode()
         self.margin_frame = MarginFrame(10)
         pygame.display.set_caption('Life Game')
         self.clock = pygame.time.Clock()
+        self._cell_surfs = {}
+        self._cell_surf_size = None
+        self._prev_grid = None
+        self._prev_positions = None
+        self._last_grid = None
+        self._last_layout = None
+        self._grid_cache = None
+        self._bg_frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._bg_frame[:] = self.bg_color
+        self._last_frame = None
+    def _set_mode(self):
+        u'''表示ウィンドウを作って画面の Surface を返す。
+        '''
+        return pygame.display.set_mode((self.width, self.height))
     def clock_tick(self, fps):
         u'''与えられたフレームレートに従って待つ。
         Args:
             fps : int : フレームレート
         '''
         self.clock.tick(fps)
+    def _grid_lines(self, cell_size, x_center, y_center, w_center, h_center):
+        u'''画面内に入るグリッド線のピクセル位置を返す。
+        表示スケールは MarginFrame のおかげで何フレームも変わらないことが
+        多いので、前回と同じ引数なら前回の結果をそのまま返す。
+        Returns:
+            tuple : (縦線の X 座標のリスト, 横線の Y 座標のリスト)
+        '''
+        key = (cell_size, x_center, y_center, w_center, h_center)
+        cache = self._grid_cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+        pxs = [px
+               for px in (int(w_center + (x + 0.5 - x_center) * cell_size)
+                          for x in range(
+                              int((x_center - w_center / cell_size) / 10) * 10,
+                              int(x_center + w_center / cell_size) + 1,
+                              10))
+               if 0 <= px < self.width]
+        pys = [py
+               for py in (int(h_center + (y + 0.5 - y_center) * cell_size)
+                          for y in range(
+                              int((y_center - h_center / cell_size) / 10) * 10,
+                              int(y_center + h_center / cell_size) + 1,
+                              10))
+               if 0 <= py < self.height]
+        self._grid_cache = (key, (pxs, pys))
+        return pxs, pys
     def _draw_grid(self, cell_size, x_center, y_center, w_center, h_center):
-        for x in range(int((x_center - w_center / cell_size) / 10) * 10,
-                       int(x_center + w_center / cell_size) + 1,
-                       10):
-            px = int(w_center + (x + 0.5 - x_center) * cell_size)
-            pygame.draw.line(self.screen, self.grid_color,
-                                 (px, 0), (px, self.height))
-        for y in range(int((y_center - h_center / cell_size) / 10) * 10,
-                       int(y_center + h_center / cell_size) + 1,
-                       10):
-            py = int(h_center + (y + 0.5 - y_center) * cell_size)
-            pygame.draw.line(self.screen, self.grid_color,
-                             (0, py), (self.width, py))
+        pxs, pys = self._grid_lines(cell_size, x_center, y_center,
+                                    w_center, h_center)
+        for px in pxs:
+            self.screen.fill(self.grid_color, (px, 0, 1, self.height))
+        for py in pys:
+            self.screen.fill(self.grid_color, (0, py, self.width, 1))
     def draw(self, dots):
         u'''「生」状態セルの set を画面上にボックスとして表示する。
         全体のバックグラウンド色は self.bg_color で、
         「生」状態セルの色は self.active_color。
         Args:
-            dots : set: 「生」セルの座標の set
+            dots : set or numpy.ndarray: 「生」セルの座標の set。
+                (N, 2) の np.int32 配列で渡せば内部での変換を省ける
+        '''
+        pxs, pys, int_cs = self._compute_layout(to_dots_array(dots))
+        positions = list(zip(pxs.tolist(), pys.tolist()))
+        cell_surf = self._get_cell_surf(int_cs)
+        if self._is_dirty_update(positions, int_cs):
+            # 表示スケールが前回と同じなら、前回のセルを消して
+            # 今回のセルを書いた部分だけを画面に反映する
+            bg_surf = self._get_cell_surf(int_cs, self.bg_color)
+            self._blits([(bg_surf, p) for p in self._prev_positions])
+            self._draw_grid(*self._last_grid)
+            self._blits([(cell_surf, p) for p in positions])
+            pygame.display.update(
+                [(px, py, int_cs, int_cs)
+                 for (px, py) in itertools.chain(self._prev_positions,
+                                                 positions)])
+        else:
+            self.screen.fill(self.bg_color)
+            self._draw_grid(*self._last_grid)
+            self._blits([(cell_surf, p) for p in positions])
+            pygame.display.flip()
+        self._prev_grid = self._last_grid
+        self._prev_positions = positions
+    def draw_bitmap(self, bitmap, x0=0, y0=0):
+        u'''「生」セルを 0/1 の二次元配列で受け取って画面に表示する。
+        セルの座標の set を作らずに済み、描画も配列演算だけで行う。
+        生きているセルが多いときは draw より速い。
+        Args:
+            bitmap : numpy.ndarray : (高さ, 幅) の配列。0 以外が「生」セル
+            x0 : int : bitmap[0, 0] に対応するセルの X 座標
+            y0 : int : bitmap[0, 0] に対応するセルの Y 座標
+        '''
+        self._last_frame = self._render_frame(
+            *self._bitmap_layout(bitmap, x0, y0), self._last_grid)
+        pygame.surfarray.blit_array(self.screen, self._last_frame.swapaxes(0, 1))
+        pygame.display.flip()
+        # 次の draw では画面全体を描き直す
+        self._prev_grid = None
+        self._prev_positions = None
+    def _bitmap_layout(self, bitmap, x0, y0):
+        u'''draw_bitmap に与えられた配列から「生」セルの画面上の位置と
+        大きさを求める。戻り値は _compute_layout と同じ。
+        '''
+        ys, xs = np.nonzero(bitmap)
+        return self._compute_layout(
+            np.column_stack((xs + x0, ys + y0)).astype(np.int32))
+    def _render_frame(self, pxs, pys, int_cs, grid):
+        u'''セルの位置と大きさから (高さ, 幅, 3) の画像配列を作る。
+        セルの左上の点を打ってから、縦横それぞれ int_cs ピクセル分
+        押し広げることで、セルの数によらない手間で描画する。
+        Args:
+            pxs, pys, int_cs : _compute_layout の結果
+            grid : tuple : _compute_layout が self._last_grid に残した値
+        '''
+        frame = self._bg_frame.copy()
+        grid_xs, grid_ys = self._grid_lines(*grid)
+        frame[:, grid_xs] = self.grid_color
+        frame[grid_ys, :] = self.grid_color
+        # 左上・上端にはみ出したセルのために int_cs だけ余白を取る
+        mask = np.zeros((self.height + int_cs, self.width + int_cs),
+                        dtype=bool)
+        mask[pys + int_cs, pxs + int_cs] = True
+        if int_cs > 1:
+            mask = _dilate(_dilate(mask, int_cs, 0), int_cs, 1)
+        frame[mask[int_cs:, int_cs:]] = self.alive_color
+        return frame
+    def _is_dirty_update(self, positions, int_cs):
+        u'''前回描画したセルの部分だけを書き換えて済ませるかどうかを返す。
+        表示スケールが変わった場合や、書き換える面積が画面に対して
+        大きすぎる場合は画面全体を描き直す。
         '''
-        x_min, y_min, x_max, y_max = self.margin_frame.set(dots)
+        if self._prev_grid != self._last_grid:
+            return False
+        dirty_area = (len(self._prev_positions) + len(positions)) * int_cs ** 2
+        return dirty_area < self.width * self.height * self.DIRTY_AREA_RATIO
+    def _compute_layout(self, arr):
+        u'''「生」セルの画面上の位置と大きさを求める。
+        結果は self._last_layout に、グリッド描画用の値は
+        self._last_grid に残しておき、サブクラスで再利用する。
+        Args:
+            arr : numpy.ndarray: 「生」セルの座標の (N, 2) の配列
+        Returns:
+            tuple : (X 座標の配列, Y 座標の配列, セルの一辺のピクセル数)
+        '''
+        x_min, y_min, x_max, y_max = self.margin_frame.set(arr)
         x_cell_size = self.width / (x_max - x_min)
         y_cell_size = self.height / (y_max - y_min)
         cell_size = min(x_cell_size, y_cell_size)
@@ -84,16 +237,47 @@ class LifeDisplay:
         y_center = (y_min + y_max) / 2
         w_center = self.width / 2
         h_center = self.height / 2
-        self.screen.fill(self.bg_color)
-        self._draw_grid(cell_size, x_center, y_center, w_center, h_center)
-        for (x, y) in dots:
-            px = int(w_center + (x - x_center) * cell_size)
-            py = int(h_center + (y - y_center) * cell_size)
-            pygame.draw.rect(self.screen, self.alive_color,
-                             pygame.Rect(px, py,
-                                         int(cell_size) if cell_size > 1.0 else 1,
-                                         int(cell_size) if cell_size > 1.0 else 1))
-        pygame.display.flip()
+        pxs = (w_center + (arr[:, 0] - x_center) * cell_size).astype(np.int32)
+        pys = (h_center + (arr[:, 1] - y_center) * cell_size).astype(np.int32)
+        int_cs = max(1, int(cell_size))
+        visible = ((pxs > -int_cs) & (pys > -int_cs)
+                   & (pxs < self.width) & (pys < self.height))
+        pxs = pxs[visible]
+        pys = pys[visible]
+        if cell_size < 1.0:
+            # 複数のセルが同じピクセルに重なるので重複を除いておく
+            packed = ((pxs.astype(np.int64) << 32)
+                      | (pys.astype(np.int64) & 0xFFFFFFFF))
+            uniq = np.unique(packed)
+            pxs = (uniq >> 32).astype(np.int32)
+            pys = (uniq & 0xFFFFFFFF).astype(np.int32)
+        self._last_grid = (cell_size, x_center, y_center, w_center, h_center)
+        self._last_layout = (pxs, pys, int_cs)
+        return self._last_layout
+    def _get_cell_surf(self, int_cs, color=None):
+        u'''一辺 int_cs ピクセルで与えられた色(省略時は「生」セルの色)の
+        セル画像を返す。セルの大きさが変わったときだけ作り直す。
+        '''
+        if color is None:
+            color = self.alive_color
+        if self._cell_surf_size != int_cs:
+            self._cell_surfs = {}
+            self._cell_surf_size = int_cs
+        cell_surf = self._cell_surfs.get(color)
+        if cell_surf is None:
+            cell_surf = pygame.Surface((int_cs, int_cs))
+            cell_surf.fill(color)
+            self._cell_surfs[color] = cell_surf
+        return cell_surf
+    def _blits(self, seq):
+        u'''(画像, 位置) の並びを一度の呼び出しで画面に転送する。
+        fblits の無い古い pygame では blits を使う。
+        '''
+        fblits = getattr(self.screen, 'fblits', None)
+        if fblits is not None:
+            fblits(seq)
+        else:
+            self.screen.blits(seq, doreturn=False)
 '''^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 表示領域上に表示可能なセルの数は敢えて引数として与えないことにしました。ライブゲームの表示セルの座標を元に自動的にスケール変換して表示します。スケールフリーなライフゲームを実現しようとしているので、そのスケールフリーな感じをイメージとして見えるようにしたいと思いました。
 
@@ -102,6 +286,74 @@ class LifeDisplay:
 そこで、ある程度のマージンを許容して表示スケールが頻繁に大きくなったり小さくなったりを繰り返すことを避けることにしました。このために作ったクラスが以下です：
 
 vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv'''
+def _jit(func):
+    u'''numba があればネイティブコードにコンパイルする。無ければそのまま返す。
+    '''
+    return njit(cache=True)(func) if njit is not None else func
+
+@_jit
+def _margin_step(value, new_value, margin, is_min, initialized):
+    u'''Margin.set_min / Margin.set_max の値の更新規則。
+    Args:
+        value : float : 前回の値 (initialized が False なら無視する)
+        new_value : float : 目標値
+        margin : float : 許容幅
+        is_min : bool : True なら最小値側、False なら最大値側
+        initialized : bool : 前回の値があるかどうか
+    Returns:
+        float : 変動を抑えた値
+    '''
+    if is_min:
+        if not initialized:
+            return new_value - 1
+        if new_value < value:
+            return new_value
+        if new_value < value + 1:
+            return value - 0.5
+        if new_value > value + margin:
+            return value + 0.25
+        return value
+    if not initialized:
+        return new_value + 1
+    if new_value > value:
+        return new_value
+    if new_value > value + 1:
+        return value + 0.5
+    if new_value < value - margin:
+        return value - 0.25
+    return value
+
+@_jit
+def _margin_bbox(xs, ys, values, margin, initialized):
+    u'''座標の配列を一度だけ走査して最小値・最大値を求め、
+    そのまま四辺のマージンを更新する。
+    Args:
+        xs : numpy.ndarray : X 座標の配列
+        ys : numpy.ndarray : Y 座標の配列
+        values : numpy.ndarray : 前回の (x_min, y_min, x_max, y_max)
+        margin : float : 許容幅
+        initialized : bool : 前回の値があるかどうか
+    Returns:
+        tuple : 変動を抑えた (x_min, y_min, x_max, y_max)
+    '''
+    x_min = x_max = xs[0]
+    y_min = y_max = ys[0]
+    for i in range(1, xs.shape[0]):
+        x, y = xs[i], ys[i]
+        if x < x_min:
+            x_min = x
+        elif x > x_max:
+            x_max = x
+        if y < y_min:
+            y_min = y
+        elif y > y_max:
+            y_max = y
+    return (
+        _margin_step(values[0], x_min, margin, True, initialized),
+        _margin_step(values[1], y_min, margin, True, initialized),
+        _margin_step(values[2], x_max + 1.0, margin, False, initialized),
+        _margin_step(values[3], y_max + 1.0, margin, False, initialized))
+
 class MarginFrame:
     u'''与えられた範囲を包含する矩形領域を、なるべく変動を抑えた形で作成する。
     '''
@@ -128,13 +380,46 @@ class MarginFrame:
         与えられた座標の集合について、その座標すべてを含む矩形領域を返す。
         なるべく前回返した矩形領域から大きく変化しないようにする。
         Args:
-          dots : Set[Tuple[int, int]] : 矩形領域に含むべき座標の集合
+          dots : Set[Tuple[int, int]] or numpy.ndarray :
+              矩形領域に含むべき座標の集合。ndarray の場合は (N, 2) の配列
         '''
+        if len(dots) == 0:
+            raise ValueError('MarginFrame.set() arg is an empty sequence')
+        if isinstance(dots, np.ndarray) and njit is not None:
+            margins = (self.x_min, self.y_min, self.x_max, self.y_max)
+            initialized = self.x_min.get_value() is not None
+            values = np.array([m.get_value() if initialized else 0.0
+                               for m in margins], dtype=np.float64)
+            bbox = _margin_bbox(dots[:, 0], dots[:, 1], values,
+                                float(self.x_min.margin), initialized)
+            for (m, value) in zip(margins, bbox):
+                m.value = float(value)
+            return tuple(m.value for m in margins)
+        if isinstance(dots, np.ndarray):
+            mins = dots.min(0)
+            maxs = dots.max(0)
+            return (
+                self._set_x_min(int(mins[0])),
+                self._set_y_min(int(mins[1])),
+                self._set_x_max(int(maxs[0]) + 1),
+                self._set_y_max(int(maxs[1]) + 1))
+        it = iter(dots)
+        x_min, y_min = next(it)
+        x_max, y_max = x_min, y_min
+        for (x, y) in it:
+            if x < x_min:
+                x_min = x
+            elif x > x_max:
+                x_max = x
+            if y < y_min:
+                y_min = y
+            elif y > y_max:
+                y_max = y
         return (
-            self._set_x_min(min([x for (x, _) in dots])),
-            self._set_y_min(min([y for (_, y) in dots])),
-            self._set_x_max(max([x for (x, _) in dots]) + 1),
-            self._set_y_max(max([y for (_, y) in dots]) + 1))
+            self._set_x_min(x_min),
+            self._set_y_min(y_min),
+            self._set_x_max(x_max + 1),
+            self._set_y_max(y_max + 1))
 class Margin:
     u'''変動する値に対して、ある程度のマージンを許すことで変動を抑える。
     '''
@@ -152,12 +437,9 @@ class Margin:
         Returns:
             float : 変動を抑えた値。目標値と同じか少ない値を常に返す。
         '''
-        self.value = (
-            new_value - 1 if self.value is None else
-            new_value if new_value < self.value else
-            (self.value - 0.5) if new_value < self.value + 1 else
-            (self.value + 0.25) if new_value > self.value + self.margin else
-            self.value)
+        self.value = _margin_step(
+            0.0 if self.value is None else self.value, float(new_value),
+            float(self.margin), True, self.value is not None)
         return self.value
     def set_max(self, new_value):
         u'''与えられた値より大きい値を返す。なるべく前回の値に近い値を返す。
@@ -167,12 +449,9 @@ class Margin:
         Returns:
             float: 変動を抑えた値。目標値と同じか大きい値を常に返す。
         '''
-        self.value = (
-            new_value + 1 if self.value is None else
-            new_value if new_value > self.value else
-            (self.value + 0.5) if new_value > self.value + 1 else
-            (self.value - 0.25) if new_value < self.value - self.margin else
-            self.value)
+        self.value = _margin_step(
+            0.0 if self.value is None else self.value, float(new_value),
+            float(self.margin), False, self.value is not None)
         return self.value
     def get_value(self):
         return self.value
@@ -189,7 +468,7 @@ from PIL import Image
 
 class LifeDisplayAndGenerateImages0(LifeDisplay):
     u'''画面上に描画し、描画した内容をアニメーション GIF に変換する。
-    あまり実用的ではなかったバージョン。
+    画面からピクセルをコピーしていたため、当初はあまり実用的ではなかったバージョン。
     '''
     def __init__(self, *args, **kwargs):
         u'''LifeDisplay と同じ引数を与える。
@@ -205,17 +484,21 @@ class LifeDisplayAndGenerateImages0(LifeDisplay):
         '''
         super(LifeDisplayAndGenerateImages0, self).draw(dots)
         self.images.append(self._get_image())
+    def draw_bitmap(self, bitmap, x0=0, y0=0):
+        u'''画面に描画し、その内容を元に画像を作る。
+        '''
+        super(LifeDisplayAndGenerateImages0, self).draw_bitmap(bitmap, x0, y0)
+        self.images.append(self._get_image())
     def _get_image(self):
         u'''
-        一ピクセルづつ画面からコピーして画像を作る。とても遅い。
-        '''
-        image = Image.new('RGB', (self.width, self.height), self.bg_color)
-        for y in range(self.height):
-            for x in range(self.width):
-                px = self.screen.get_at((x, y))
-                # 注意： px を tuple にして putpixel に与えなければならない
-                image.putpixel((x, y), tuple(px))
-        return image
+        画面の内容をまとめてバイト列として取り出して画像を作る。
+        一ピクセルづつコピーしていた最初の版はとても遅かった。
+        '''
+        tobytes = getattr(pygame.image, 'tobytes', None)
+        if tobytes is None:
+            tobytes = pygame.image.tostring
+        return Image.frombytes('RGB', (self.width, self.height),
+                               tobytes(self.screen, 'RGB'))
     def generate_animation_gif(self, gen_file_path, **kwargs):
         u'''与えられたファイルパス名でアニメーション GIF を作る。
         '''
@@ -226,59 +509,195 @@ class LifeDisplayAndGenerateImages0(LifeDisplay):
 Pygame の画面をそのままピクセル単位でコピーするのはあまりに非効率的なので、画面に書くのと全く同じロジックで Image に描画することにしました。これで普通に使えるレベルになりました。
 
 vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv'''
-from PIL import ImageDraw
+def _render_worker(display_ref, frame_queue):
+    u'''キューから受け取ったフレームを描画して記録し続ける。
+    pygame の描画はメインスレッドで行う必要があるので、
+    画像の描画とエンコードだけをこのスレッドで並行して行う。
+    None を受け取るか、表示オブジェクトが捨てられていれば終了する。
+    表示オブジェクトは弱参照で持ち、このスレッドが表示オブジェクトを
+    生かし続けないようにする。
+    '''
+    while True:
+        item = frame_queue.get()
+        display = None
+        try:
+            if item is None:
+                return
+            display = display_ref()
+            if display is None:
+                return
+            if display._worker_error is None:
+                frame = (item if isinstance(item, np.ndarray) else
+                         display._render_frame(*item))
+                display._record(frame)
+        except Exception as e:
+            display._worker_error = e
+        finally:
+            display = None
+            frame_queue.task_done()
+
+def _request_worker_stop(frame_queue):
+    u'''表示オブジェクトが捨てられたときにワーカースレッドに終了を伝える。
+    ワーカースレッド自身から呼ばれることもあるので決して待たない。
+    キューが一杯なら、ワーカースレッドは次のフレームを取り出したときに
+    表示オブジェクトが無いことに気付いて終了する。
+    '''
+    try:
+        frame_queue.put_nowait(None)
+    except queue.Full:
+        pass
 
 class LifeDisplayAndGenerateImages(LifeDisplay):
     u'''画面に描画し、その内容を GIF アニメーションファイルにする。
     '''
-    def __init__(self, *args, **kwargs):
+    VIDEO_CODECS = {'.mp4': 'libx264', '.webm': 'libvpx-vp9'}
+    def __init__(self, *args, record_only=False, **kwargs):
         u'''LifeDisplay と同じ引数を与える。
+        Args:
+            record_only : bool : True なら画面には表示せず、記録だけを行う。
+                ウィンドウは pygame.HIDDEN で作るので表示されない。
+                pygame のウィンドウはプロセスに一つなので、後から別の
+                LifeDisplay を作るとそちらの設定で作り直される
         '''
+        self.record_only = record_only
         super(LifeDisplayAndGenerateImages, self).__init__(*args, **kwargs)
-        self.images = []
-    def draw_grid(self, draw, cell_size, x_center, y_center,
-                  w_center, h_center):
-        for x in range(int((x_center - w_center / cell_size) / 10) * 10,
-                       int(x_center + w_center / cell_size) + 1,
-                       10):
-            px = int(w_center + (x + 0.5 - x_center) * cell_size)
-            draw.line((px, 0, px, self.height), fill=self.grid_color)
-        for y in range(int((y_center - h_center / cell_size) / 10) * 10,
-                       int(y_center + h_center / cell_size) + 1,
-                       10):
-            py = int(h_center + (y + 0.5 - y_center) * cell_size)
-            draw.line((0, py, self.width, py), fill=self.grid_color)
+        self._images = []
+        self._writer = None
+        self._frame_queue = queue.Queue(maxsize=4)
+        self._worker = None
+        self._stop_worker = None
+        self._worker_error = None
+    def _set_mode(self):
+        u'''record_only なら表示しないウィンドウを作る。
+        '''
+        if self.record_only:
+            return pygame.display.set_mode((self.width, self.height),
+                                           pygame.HIDDEN)
+        return super(LifeDisplayAndGenerateImages, self)._set_mode()
+    @property
+    def images(self):
+        u'''記録したフレーム (高さ, 幅, 3) の配列の list。
+        フレームはワーカースレッドで記録されるので、
+        キューに残っているフレームの記録が終わるのを待ってから返す。
+        '''
+        self.close()
+        return self._images
+    @images.setter
+    def images(self, images):
+        self.close()
+        self._images = images
+    def clock_tick(self, fps):
+        u'''画面に表示しない場合は待つ必要がないので何もしない。
+        '''
+        if self.record_only:
+            return
+        super(LifeDisplayAndGenerateImages, self).clock_tick(fps)
     def draw(self, dots):
         u'''LifeDisplay と同じ引数を与える。
+        画面描画時に求めたセルの位置と大きさをそのまま使い、
+        (高さ, 幅, 3) の配列への描画と記録はワーカースレッドで行う。
         '''
-        super(LifeDisplayAndGenerateImages, self).draw(dots)
-        image = Image.new('RGB', (self.width, self.height), self.bg_color)
-        draw = ImageDraw.Draw(image)
-        x_min, y_min, x_max, y_max = self.margin_frame.set(dots)
-        x_cell_size = self.width / (x_max - x_min)
-        y_cell_size = self.height / (y_max - y_min)
-        cell_size = min(x_cell_size, y_cell_size)
-        x_center = (x_min + x_max) / 2
-        y_center = (y_min + y_max) / 2
-        w_center = self.width / 2
-        h_center = self.height / 2
-        self.draw_grid(draw, cell_size, x_center, y_center, w_center, h_center)
-        for (x, y) in dots:
-            px = int(w_center + (x - x_center) * cell_size)
-            py = int(h_center + (y - y_center) * cell_size)
-            draw.rectangle((px, py,
-                            px + int(cell_size) if cell_size > 1.0 else 1,
-                            py + int(cell_size) if cell_size > 1.0 else 1),
-                           fill=self.alive_color)
-        self.images.append(image)
+        if self.record_only:
+            self._compute_layout(to_dots_array(dots))
+        else:
+            super(LifeDisplayAndGenerateImages, self).draw(dots)
+        self._enqueue(self._last_layout + (self._last_grid,))
+    def draw_bitmap(self, bitmap, x0=0, y0=0):
+        u'''LifeDisplay.draw_bitmap と同じ引数を与える。
+        画面に転送した画像配列をそのまま記録する。
+        '''
+        if self.record_only:
+            self._last_frame = self._render_frame(
+                *self._bitmap_layout(bitmap, x0, y0), self._last_grid)
+        else:
+            super(LifeDisplayAndGenerateImages, self).draw_bitmap(
+                bitmap, x0, y0)
+        self._enqueue(self._last_frame)
+    def _enqueue(self, item):
+        u'''フレームをワーカースレッドに渡す。
+        ワーカースレッドは最初のフレームで起動する。
+        '''
+        self._raise_worker_error()
+        if self._worker is None:
+            self._worker = threading.Thread(
+                target=_render_worker,
+                args=(weakref.ref(self), self._frame_queue), daemon=True)
+            self._worker.start()
+            # close されないまま捨てられてもスレッドを終わらせる
+            self._stop_worker = weakref.finalize(
+                self, _request_worker_stop, self._frame_queue)
+            self._stop_worker.atexit = False
+        self._frame_queue.put(item)
+    def _raise_worker_error(self):
+        u'''ワーカースレッドで例外が起きていれば送出する。
+        '''
+        if self._worker_error is not None:
+            error, self._worker_error = self._worker_error, None
+            raise error
+    def close(self):
+        u'''キューに残っているフレームの描画と記録が終わるのを待って
+        ワーカースレッドを終了する。
+        ワーカースレッドで例外が起きていればここで送出する。
+        '''
+        if self._worker is not None:
+            self._stop_worker.detach()
+            self._frame_queue.put(None)
+            self._worker.join()
+            self._worker = None
+            self._stop_worker = None
+        self._raise_worker_error()
+    def _record(self, frame):
+        u'''描画したフレームを記録する。
+        録画中ならファイルに書き出し、そうでなければ self.images に貯める。
+        '''
+        if self._writer is not None:
+            self._writer.append_data(frame)
+        else:
+            self._images.append(frame)
+    def start_recording(self, gen_file_path, **kwargs):
+        u'''以後描画するフレームを、メモリに貯めずに逐次ファイルに書き出す。
+        長時間実行してもメモリ使用量が増えない。
+        Args:
+            gen_file_path : str : 動画ファイル作成先パス名
+            kwargs : imageio.get_writer に渡す引数 (fps など)
+        '''
+        import imageio.v2 as imageio
+        self.stop_recording()
+        self._writer = imageio.get_writer(gen_file_path, **kwargs)
+    def stop_recording(self):
+        u'''start_recording で始めた書き出しを終えてファイルを閉じる。
+        '''
+        self.close()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
     def generate_animation_gif(self, gen_file_path, **kwargs):
         u'''与えられたファイルパス名でアニメーション GIF を作る。
         Args:
             gen_file_path : str : アニメーション GIF ファイル作成先パス名
         '''
-        self.images[0].save(gen_file_path,
-                            save_all=True, append_images=self.images[1:],
-                            **kwargs)
+        images = self.images
+        Image.fromarray(images[0]).save(
+            gen_file_path, save_all=True,
+            append_images=(Image.fromarray(frame) for frame in images[1:]),
+            **kwargs)
+    def generate_animation(self, gen_file_path, fps=30, **kwargs):
+        u'''与えられたファイルパス名の拡張子に応じた形式で動画を作る。
+        .gif なら generate_animation_gif と同じく Pillow で、
+        それ以外 (.mp4, .webm など) は imageio (ffmpeg) でエンコードする。
+        Args:
+            gen_file_path : str : 動画ファイル作成先パス名
+            fps : int : フレームレート
+        '''
+        ext = os.path.splitext(gen_file_path)[1].lower()
+        if ext == '.gif':
+            kwargs.setdefault('duration', 1000 // fps)
+            self.generate_animation_gif(gen_file_path, **kwargs)
+            return
+        import imageio.v3 as iio
+        if ext in self.VIDEO_CODECS:
+            kwargs.setdefault('codec', self.VIDEO_CODECS[ext])
+        iio.imwrite(gen_file_path, self.images, fps=fps, **kwargs)
 '''^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
 ![acorn_mini.gif](https://qiita-image-store.s3.ap-northeast-1.amazonaws.com/0/412308/a9a6407e-9e1e-de3d-a2b3-b4d20b9c1d00.gif)
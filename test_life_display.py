@@ -0,0 +1,88 @@
+# -*- coding: utf-8; mode:python -*-
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pytest
+
+import life_display
+
+
+@pytest.mark.parametrize('use_njit', [True, False])
+@pytest.mark.parametrize('dots', [set(), np.zeros((0, 2), dtype=np.int32)])
+def test_margin_frame_set_rejects_empty_input(monkeypatch, use_njit, dots):
+    if use_njit and life_display.njit is None:
+        pytest.skip('numba is not installed')
+    if not use_njit:
+        monkeypatch.setattr(life_display, 'njit', None)
+    margin_frame = life_display.MarginFrame(10)
+    with pytest.raises(ValueError):
+        margin_frame.set(dots)
+    # 失敗した呼び出しでマージンが壊れていないこと
+    assert margin_frame.set({(1, 1)}) == (0, 0, 3, 3)
+
+
+def _glider():
+    return {(1, 0), (2, 1), (0, 2), (1, 2), (2, 2)}
+
+
+@pytest.mark.parametrize('frames, record_delay', [(1, 0), (5, 0.3)])
+def test_generate_images_worker_does_not_keep_display_alive(
+        frames, record_delay):
+    import gc
+    import time
+    import weakref
+    display = life_display.LifeDisplayAndGenerateImages(
+        width=40, height=30, record_only=True)
+    if record_delay:
+        # 捨てた時点でキューが一杯になっているようにする
+        display._record = lambda frame: time.sleep(record_delay)
+    for _ in range(frames):
+        display.draw(_glider())
+    worker = display._worker
+    display_ref = weakref.ref(display)
+    del display
+    gc.collect()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert display_ref() is None
+
+
+def test_generate_images_close_stops_worker():
+    display = life_display.LifeDisplayAndGenerateImages(
+        width=40, height=30, record_only=True)
+    display.draw(_glider())
+    worker = display._worker
+    display.close()
+    assert not worker.is_alive()
+    assert len(display.images) == 1
+
+
+def test_generate_images_worker_error_is_raised_by_next_draw(monkeypatch):
+    display = life_display.LifeDisplayAndGenerateImages(
+        width=40, height=30, record_only=True)
+    def fail(frame):
+        raise IOError('disk full')
+    monkeypatch.setattr(display, '_record', fail)
+    display.draw(_glider())
+    display._frame_queue.join()
+    with pytest.raises(IOError):
+        display.draw(_glider())
+    display.close()
+
+
+def test_generate_images0_records_draw_bitmap():
+    display = life_display.LifeDisplayAndGenerateImages0(width=40, height=30)
+    display.draw(_glider())
+    display.draw_bitmap(np.array([[0, 1, 0], [0, 0, 1], [1, 1, 1]]))
+    assert len(display.images) == 2
+    assert np.array_equal(np.asarray(display.images[0]),
+                          np.asarray(display.images[1]))
+
+
+def test_generate_images_images_include_last_draw():
+    display = life_display.LifeDisplayAndGenerateImages(
+        width=40, height=30, record_only=True)
+    for n in range(1, 4):
+        display.draw(_glider())
+        assert len(display.images) == n